@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Title: Acquisition
+
+Description: Zero-copy acquisition helpers for the MSO7024. The IEEE-488.2
+block returned by WAV:DATA? is read directly into preallocated uint8 buffers
+that are reused between points (ring of buffers), and exposed as NumPy views.
+Any set of channels is fetched back-to-back into one (channels, points) array.
+Long captures are read in batches of BATCH_POINTS (WAV:STAR/WAV:STOP), the
+maximum of one RAW byte block of the MSO7024, into consecutive slices of the
+same buffer.
+The conversion to voltage is done in float32, in place, only when it is
+requested, and the time axis is kept as start/increment.
+
+"""
+
+# %% libreries
+import numpy as np
+import pandas as pd
+from logging import info
+
+
+#%% Definitions
+BATCH_POINTS = 250000 	# Puntos máximos por bloque WAV:DATA? en modo RAW (BYTE)
+
+
+class BufferRing:
+	"""Ring of preallocated uint8 buffers reused between points"""
+
+	def __init__(self, size=2, capacity=0):
+		self.raw 	= [np.empty(capacity, dtype=np.uint8) for _ in range(size)]
+		self.volts 	= [np.empty(capacity, dtype=np.float32) for _ in range(size)]
+		self.index 	= -1
+
+	def next(self, *shape):
+		"""Return the next raw buffer as a view of the given shape (channels, points)"""
+		self.index = (self.index + 1) % len(self.raw)
+		length = int(np.prod(shape))
+		if self.raw[self.index].size < length:
+			info(f"Allocating acquisition buffer of {length} points")
+			self.raw[self.index] 	= np.empty(length, dtype=np.uint8)
+			self.volts[self.index] 	= np.empty(0, dtype=np.float32)
+		return self.raw[self.index][:length].reshape(shape)
+
+	def scratch(self, index, shape):
+		"""Return the float32 buffer of the slot index as a view of the given shape"""
+		length = int(np.prod(shape))
+		if self.volts[index].size < length:
+			self.volts[index] = np.empty(self.raw[index].size, dtype=np.float32)
+		return self.volts[index][:length].reshape(shape)
+
+
+class Waveform:
+	"""Raw capture of one or more channels with their scale, converted to voltage on demand"""
+
+	def __init__(self, raw, YRef, dV, XRef, t0=0.0, channels=None, ring=None):
+		self.raw 	= raw 	# uint8 view (channels, points), no copy
+		self.YRef 	= np.asarray(YRef, dtype=np.float32).reshape(-1, 1) if raw.ndim == 2 else np.float32(YRef)
+		self.dV 	= np.asarray(dV, dtype=np.float32).reshape(-1, 1) if raw.ndim == 2 else np.float32(dV)
+		self.XRef 	= XRef 	# time increment
+		self.t0 	= t0 	# time start
+		self.channels = channels
+		self.ring 	= ring
+		self.slot 	= ring.index if ring is not None else None
+		self._volts = None
+
+	def __len__(self):
+		return self.raw.shape[-1]
+
+	def volts(self):
+		"""Convert bit data to float32 voltage, reusing the ring buffer"""
+		if self._volts is None:
+			out = self.ring.scratch(self.slot, self.raw.shape) if self.ring is not None else None
+			self._volts = raw_to_voltage(self.raw, self.YRef, self.dV, out=out)
+		return self._volts
+
+	def time(self):
+		"""Build the time axis from start/increment"""
+		return self.t0 + np.arange(len(self), dtype=np.float64)*self.XRef
+
+
+def raw_to_voltage(raw, YRef, dV, out=None):
+	"""Convert bit data to float32 voltage writing into out"""
+	if out is None:
+		out = np.empty(raw.shape, dtype=np.float32)
+	np.subtract(raw, np.float32(YRef), out=out, dtype=np.float32) # Se elimina la referencia
+	np.multiply(out, np.float32(dV), out=out) 						# se escala en voltaje
+	return out
+
+
+def read_block(osc, out, command="WAV:DATA?"):
+	"""Read an IEEE-488.2 definite length block into out, return the filled view"""
+	osc.write(command)
+	header = osc.read_bytes(2) 	# "#N"
+	if header[:1] != b"#":
+		raise ValueError(f"Invalid block header {header!r}")
+	length = int(osc.read_bytes(int(header[1:2])))
+	if length > out.size:
+		raise ValueError(f"Block of {length} points does not fit in buffer of {out.size}")
+
+	view 	 = memoryview(out)
+	received = 0
+	while received < length:
+		chunk = osc.read_bytes(min(osc.chunk_size, length - received))
+		view[received:received + len(chunk)] = chunk
+		received += len(chunk)
+	osc.read_bytes(1) 			# terminación "\n"
+	return out[:length]
+
+
+def read_channel(osc, out, batch=BATCH_POINTS):
+	"""Read the current source in batches of batch points into out (points,)"""
+	points = out.size
+	for start in range(0, points, batch):
+		stop = min(start + batch, points)
+		osc.write(f"WAV:STAR {start + 1}")
+		osc.write(f"WAV:STOP {stop}")
+		length = len(read_block(osc, out[start:stop]))
+		if length != stop - start:
+			raise ValueError(f"Block of {length} points, expected {stop - start} (points {start + 1}-{stop})")
+	return out
+
+
+def dictionary_measurements(osc, channel, shared):
+	"""Create a dictionary of measurements' parameters of the current source"""
+	# <format>,<type>,<points>,<count>,<xincrement>,<xorigin>,<xreference>,<yincrement>,<yorigin>,<yreference>
+	preamble = osc.query_ascii_values("WAV:PRE?")
+	dict = {
+			"channel" : channel,
+			"timescale" : shared["timescale"],
+			"timeoffset" : shared["timeoffset"],
+			"voltscale" : osc.query_ascii_values(':CHAN'+str(channel)+':SCAL?')[0],
+			"voltoffset" : osc.query_ascii_values(":CHAN"+str(channel)+":OFFS?")[0],
+			"sample_rate" : shared["sample_rate"],
+			"XRef" : preamble[4],
+			"YRef" : preamble[9],
+			"dV" : preamble[7],
+			"points" : int(preamble[2])
+	}
+	return dict
+
+
+def fetch_channels(osc, ring, channels=(1, 2)):
+	"""Fetch the channels back-to-back into one (channels, points) buffer of the ring"""
+	shared = {
+			"timescale" : osc.query_ascii_values(":TIM:SCAL?")[0],
+			"timeoffset" : osc.query_ascii_values(":TIM:OFFS?")[0],
+			"sample_rate" : osc.query_ascii_values('ACQuire:SRATe?')[0]
+	}
+
+	rows, raw = [], None
+	for index, channel in enumerate(channels):
+		osc.write(f"WAV:SOUR CHAN{channel}")  # Solicitar la forma de onda del canal
+		rows.append(dictionary_measurements(osc, channel, shared))
+		if raw is None:
+			raw = ring.next(len(channels), rows[0]["points"])
+		elif rows[-1]["points"] != raw.shape[1]:
+			raise ValueError(f"CH{channel} has {rows[-1]['points']} points, CH{channels[0]} has {raw.shape[1]}")
+		read_channel(osc, raw[index])
+
+	df_setup = pd.DataFrame(rows)
+	waveform = Waveform(raw, df_setup["YRef"], df_setup["dV"], df_setup["XRef"][0], channels=list(channels), ring=ring)
+	return waveform, df_setup
+
+
+def save_waveform(file_name, waveform):
+	"""Save the raw bit data (channels, points) without conversion"""
+	np.save(file_name, waveform.raw)
+
+
+def load_waveform(file_name, df_setup):
+	"""Load raw bit data as a memory map with the scale of its setup file"""
+	raw = np.load(file_name, mmap_mode="r")
+	return Waveform(raw, df_setup["YRef"], df_setup["dV"], df_setup["XRef"][0], channels=list(df_setup["channel"]))
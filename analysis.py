@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Title: Analysis
+
+Description: Frequency response of the captured channels. The amplitude and
+phase at the excitation frequency are obtained for every channel of a
+Waveform with a single DFT bin, computed by blocks to keep the memory
+bounded for long captures.
+
+"""
+
+# %% libreries
+import numpy as np
+
+from acquisition import raw_to_voltage
+
+
+#%% Definitions
+def tone_response(waveform, frequency, block=1 << 20):
+	"""Amplitude and phase (rad) of each channel of a Waveform at frequency
+
+	The bit data is converted to voltage by blocks into a small scratch buffer,
+	so the full float32 array of the capture is never built.
+	"""
+	raw 	= np.atleast_2d(waveform.raw)
+	n 		= raw.shape[1]
+	YRef 	= np.asarray(waveform.YRef, dtype=np.float32).reshape(-1, 1)
+	dV 		= np.asarray(waveform.dV, dtype=np.float32).reshape(-1, 1)
+	scratch = np.empty((len(raw), min(block, n)), dtype=np.float32)
+	blocks 	= ((start, raw_to_voltage(raw[:, start:start + block], YRef, dV, out=scratch[:, :min(block, n - start)]))
+			   for start in range(0, n, block))
+	return single_bin(blocks, raw.shape, waveform.XRef, frequency, waveform.t0)
+
+
+def tone_amplitude_phase(volts, XRef, frequency, t0=0.0, block=1 << 20):
+	"""Amplitude and phase (rad) of each row of volts (channels, points) at frequency"""
+	volts 	= np.atleast_2d(volts)
+	blocks 	= ((start, volts[:, start:start + block]) for start in range(0, volts.shape[1], block))
+	return single_bin(blocks, volts.shape, XRef, frequency, t0)
+
+
+def single_bin(blocks, shape, XRef, frequency, t0=0.0):
+	"""Single DFT bin at frequency accumulated over blocks (start, volts) of a (channels, points) capture"""
+	channels, n = shape
+	acc = np.zeros(channels, dtype=np.complex128)
+	for start, volts in blocks:
+		t 	 = t0 + np.arange(start, start + volts.shape[1], dtype=np.float64)*XRef
+		acc += volts @ np.exp(-2j*np.pi*frequency*t)
+	acc *= 2/n
+	return np.abs(acc), np.angle(acc)
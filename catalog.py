@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Title: Catalog
+
+Description: Local SQLite catalog of the sweeps saved in the med directory.
+It holds the configuration of each run (global_configuration.csv), the setup
+of each point and channel (setup_measurements_<frequency>.csv) and the
+amplitude/phase at each frequency (response_segment_*.csv for the broadband
+excitations), so runs can be found and their responses compared without
+opening every folder.
+
+The catalog is updated point by point from frequency_sweep.py, and existing
+folders are added with backfill() (run this file to backfill ./med/).
+
+"""
+
+# %% libreries
+import os
+import re
+import sqlite3
+import datetime
+import logging
+from logging import info, error
+import numpy as np
+import pandas as pd
+
+from acquisition import load_waveform
+from analysis import tone_response, tone_amplitude_phase
+
+#%% Definitions
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+	id 				INTEGER PRIMARY KEY,
+	folder 			TEXT UNIQUE NOT NULL,
+	date 			TEXT,
+	name 			TEXT,
+	start_frequency REAL,
+	stop_frequency 	REAL,
+	d_frequency 	REAL,
+	voltaje_source 	REAL,
+	sample_rate 	TEXT,
+	time_base 		TEXT,
+	channels 		TEXT,
+	excitation 		TEXT
+);
+CREATE TABLE IF NOT EXISTS points (
+	run_id 		INTEGER NOT NULL REFERENCES runs(id),
+	frequency 	REAL NOT NULL,
+	channel 	INTEGER NOT NULL,
+	timescale 	REAL,
+	timeoffset 	REAL,
+	voltscale 	REAL,
+	voltoffset 	REAL,
+	sample_rate REAL,
+	XRef 		REAL,
+	YRef 		REAL,
+	dV 			REAL,
+	points 		INTEGER,
+	amplitude 	REAL,
+	phase 		REAL,
+	PRIMARY KEY (run_id, frequency, channel)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_name ON runs(name);
+CREATE INDEX IF NOT EXISTS idx_runs_frequency ON runs(start_frequency, stop_frequency);
+CREATE INDEX IF NOT EXISTS idx_points_frequency ON points(frequency);
+"""
+
+RUN_COLUMNS 	= ["start_frequency", "stop_frequency", "d_frequency", "voltaje_source", "sample_rate", "time_base", "channels", "excitation"]
+POINT_COLUMNS 	= ["timescale", "timeoffset", "voltscale", "voltoffset", "sample_rate", "XRef", "YRef", "dV", "points", "amplitude", "phase"]
+
+
+def connect(file_name="./med/catalog.db"):
+	"""Open the catalog, creating the tables if needed"""
+	con = sqlite3.connect(file_name)
+	con.executescript(SCHEMA)
+
+	# Catálogos creados antes de la columna excitation (backfill() la completa)
+	if "excitation" not in {column for (_, column, *rest) in con.execute("PRAGMA table_info(runs)")}:
+		con.execute("ALTER TABLE runs ADD COLUMN excitation TEXT")
+		con.commit()
+	return con
+
+
+def split_folder(folder):
+	"""Date and sample name from a folder name like '2023-03-31_00_09 Barrido cilindro'"""
+	base  = os.path.basename(os.path.normpath(folder))
+	match = re.match(r"(\d{4}-\d{2}-\d{2}_\d{2}_\d{2}(?:_\d{2})?)\s*(.*)", base)
+	if match is None:
+		return None, base
+	format = "%Y-%m-%d_%H_%M_%S" if match.group(1).count("_") == 3 else "%Y-%m-%d_%H_%M"
+	date = datetime.datetime.strptime(match.group(1), format).isoformat(sep=" ")
+	return date, match.group(2)
+
+
+def add_run(con, folder, df_global_config=None):
+	"""Add (or update) a run and return its id"""
+	date, name = split_folder(folder)
+	config = {column: None for column in RUN_COLUMNS}
+	if df_global_config is not None:
+		config.update({"excitation": "sine"}) 	# Corridas anteriores a las excitaciones de banda ancha
+		config.update({k: v for k, v in df_global_config.iloc[0].items() if k in config})
+	config = {k: (v.item() if hasattr(v, "item") else v) for k, v in config.items()}
+
+	con.execute(
+		f"INSERT INTO runs (folder, date, name, {', '.join(RUN_COLUMNS)}) VALUES (?, ?, ?, {', '.join('?'*len(RUN_COLUMNS))}) "
+		f"ON CONFLICT(folder) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in RUN_COLUMNS)}",
+		[os.path.normpath(folder), date, name] + [config[c] for c in RUN_COLUMNS])
+	con.commit()
+	return con.execute("SELECT id FROM runs WHERE folder = ?", (os.path.normpath(folder),)).fetchone()[0]
+
+
+def add_response(con, run_id, df_response):
+	"""Add rows with the frequency, channel, setup and response of a run"""
+	rows = []
+	for index, row in df_response.reset_index(drop=True).iterrows():
+		values = [row[c].item() if c in row and hasattr(row[c], "item") else row.get(c) for c in POINT_COLUMNS]
+		rows.append([run_id, float(row["frequency"]), int(row["channel"])] + values)
+
+	con.executemany(
+		f"INSERT OR REPLACE INTO points (run_id, frequency, channel, {', '.join(POINT_COLUMNS)}) "
+		f"VALUES (?, ?, ?, {', '.join('?'*len(POINT_COLUMNS))})", rows)
+	con.commit()
+
+
+def add_point(con, run_id, frequency, df_setup):
+	"""Add the setup and response of every channel of a point"""
+	df_setup = df_setup.reset_index(drop=True)
+	if "channel" not in df_setup:
+		df_setup = df_setup.assign(channel=df_setup.index + 1)
+	add_response(con, run_id, df_setup.assign(frequency=frequency))
+
+
+def read_csv_waveform(file_name):
+	"""Channels, volts (channels, points), XRef and t0 of a waveform saved as csv (Tiempo s, CH<n> V)"""
+	df 		 = pd.read_csv(file_name, index_col=0)
+	columns  = [column for column in df.columns if re.fullmatch(r"CH\d+ V", column)]
+	channels = [int(column[2:-2]) for column in columns]
+	t 		 = df["Tiempo s"].to_numpy()
+	return channels, df[columns].to_numpy(dtype=np.float32).T, t[1] - t[0], t[0]
+
+
+def analyse_point(path, name, frequency, df_setup):
+	"""Add amplitude/phase to the setup of a point from its <name>.npy or <name>.csv waveform"""
+	df_setup = df_setup.reset_index(drop=True)
+	if "channel" not in df_setup:
+		df_setup["channel"] = df_setup.index + 1
+
+	file_waveform = os.path.join(path, name + ".npy")
+	if os.path.exists(file_waveform):
+		df_setup["amplitude"], df_setup["phase"] = tone_response(load_waveform(file_waveform, df_setup), frequency)
+		return df_setup
+
+	file_waveform = os.path.join(path, name + ".csv")
+	if os.path.exists(file_waveform):
+		channels, volts, XRef, t0 = read_csv_waveform(file_waveform)
+		amplitude, phase = tone_amplitude_phase(volts, XRef, frequency, t0)
+		response = pd.DataFrame({"channel": channels, "amplitude": amplitude, "phase": phase})
+		df_setup = df_setup.merge(response, on="channel", how="left")
+	return df_setup
+
+
+def backfill(con, directory="./med/"):
+	"""Add the runs and points of the existing folders that are not in the catalog
+
+	The amplitude/phase of the points that do not have it are computed from their
+	<frequency>.npy or <frequency>.csv waveform. The start/stop frequency of the
+	folders without global_configuration.csv are those of their points.
+	"""
+	for folder in sorted(os.listdir(directory)):
+		path = os.path.join(directory, folder)
+		if not os.path.isdir(path):
+			continue
+
+		file_config 	 = os.path.join(path, "global_configuration.csv")
+		df_global_config = pd.read_csv(file_config, index_col=0) if os.path.exists(file_config) else None
+		run_id 			 = add_run(con, path, df_global_config)
+		known 			 = {f for (f,) in con.execute("SELECT DISTINCT frequency FROM points WHERE run_id = ? AND amplitude IS NOT NULL", (run_id,))}
+
+		for file in sorted(os.listdir(path)):
+			if re.fullmatch(r"response_segment_\d+(?:\.\d+)?\.csv", file):
+				add_response(con, run_id, pd.read_csv(os.path.join(path, file), index_col=0))
+				continue
+			match = re.fullmatch(r"setup_measurements_(\d+(?:\.\d+)?)\.csv", file)
+			if match is None or float(match.group(1)) in known:
+				continue
+			frequency = float(match.group(1))
+			df_setup  = pd.read_csv(os.path.join(path, file), index_col=0)
+
+			# Se calcula la respuesta de las mediciones sin amplitud/fase
+			if "amplitude" not in df_setup:
+				try:
+					df_setup = analyse_point(path, match.group(1), frequency, df_setup)
+				except Exception:
+					error("Error analysing " + os.path.join(path, match.group(1)))
+			add_point(con, run_id, frequency, df_setup)
+
+		# Sin configuración global el barrido se toma de las frecuencias medidas
+		if df_global_config is None:
+			con.execute(
+				"UPDATE runs SET (start_frequency, stop_frequency) = "
+				"(SELECT MIN(frequency), MAX(frequency) FROM points WHERE run_id = ?) WHERE id = ?", (run_id, run_id))
+			con.commit()
+		info("Catalogued " + path)
+
+
+def find_runs(con, name=None, min_frequency=None, max_frequency=None, voltaje_source=None, excitation=None):
+	"""Runs whose name contains name and whose sweep lies within [min_frequency, max_frequency]"""
+	conditions, parameters = [], []
+	if name is not None:
+		conditions.append("name LIKE ?")
+		parameters.append(f"%{name}%")
+	if min_frequency is not None:
+		conditions.append("start_frequency >= ?")
+		parameters.append(min_frequency)
+	if max_frequency is not None:
+		conditions.append("stop_frequency <= ?")
+		parameters.append(max_frequency)
+	if voltaje_source is not None:
+		conditions.append("voltaje_source = ?")
+		parameters.append(voltaje_source)
+	if excitation is not None:
+		conditions.append("excitation = ?")
+		parameters.append(excitation)
+	where = " WHERE " + " AND ".join(conditions) if conditions else ""
+	return pd.read_sql_query("SELECT * FROM runs" + where + " ORDER BY date", con, params=parameters)
+
+
+def response(con, run_ids, channel=None, min_frequency=None, max_frequency=None):
+	"""Amplitude and phase by frequency of the runs, ready to overlay"""
+	run_ids = [int(run_id) for run_id in run_ids]
+	conditions, parameters = [f"p.run_id IN ({', '.join('?'*len(run_ids))})"], list(run_ids)
+	if channel is not None:
+		conditions.append("p.channel = ?")
+		parameters.append(channel)
+	if min_frequency is not None:
+		conditions.append("p.frequency >= ?")
+		parameters.append(min_frequency)
+	if max_frequency is not None:
+		conditions.append("p.frequency <= ?")
+		parameters.append(max_frequency)
+	return pd.read_sql_query(
+		"SELECT r.name, p.run_id, p.frequency, p.channel, p.amplitude, p.phase "
+		"FROM points p JOIN runs r ON r.id = p.run_id "
+		"WHERE " + " AND ".join(conditions) + " ORDER BY p.run_id, p.channel, p.frequency",
+		con, params=parameters)
+
+
+#%% Backfill of the existing folders
+if __name__ == "__main__":
+	logging.basicConfig(format="[%(levelname)s] %(message)s")
+	logging.getLogger().setLevel(logging.INFO)
+
+	con = connect()
+	backfill(con)
+	print(find_runs(con))
+	con.close()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Title: Excitation
+
+Description: Broadband excitation with the arbitrary waveform memory of the
+AFG_2225. A multi-tone (Schroeder phases, low crest factor) or a linear/log
+chirp covering a band is computed as one period of PERIOD_POINTS points and
+uploaded once over the serial link; the response is captured in CH1
+(excitation) and CH2 (receiver) together, and the transfer function at every
+tone is recovered with an FFT deconvolution.
+
+The tones are harmonics of the repetition frequency f_rep of the period, so
+the resolution of a segment is limited by the arbitrary memory:
+f_rep >= f_max*samples_per_cycle/PERIOD_POINTS. Wide bands are tiled in
+segments with segments().
+
+"""
+
+# %% libreries
+import math
+import time
+from logging import info
+import numpy as np
+import scipy.fft
+
+#%% Definitions
+PERIOD_POINTS 	= 4096 	# Puntos de la memoria arbitraria del AFG_2225
+DAC_MAX 		= 511 	# Resolución vertical de 10 bits (-511 a 511)
+
+
+def repetition_frequency(fa, needed, d_frequency):
+	"""Smallest multiple of d_frequency >= needed that has fa as a harmonic, or None"""
+	m = math.ceil(needed/d_frequency)
+	while m*d_frequency <= 2*needed:
+		ratio = fa/(m*d_frequency)
+		if abs(ratio - round(ratio)) < 1e-9:
+			return m*d_frequency
+		m += 1
+	return None
+
+
+def segments(start_frequency, stop_frequency, d_frequency, max_tones=256, points=PERIOD_POINTS, samples_per_cycle=8):
+	"""Split the band in segments, return a list of (f_rep, tone frequencies)
+
+	The first tone is start_frequency when f_rep (up to twice the finest
+	possible) can be chosen with it as a harmonic; otherwise start_frequency
+	is snapped to the harmonic just below it. The tones start at harmonic 1
+	(no DC), so a start_frequency <= 0 starts at f_rep.
+	"""
+	k_max  = points // samples_per_cycle
+	result = []
+	fa 	   = start_frequency
+	while fa < stop_frequency:
+		fb 	   = min(stop_frequency, fa + max_tones*d_frequency)
+		needed = max(d_frequency, fb/k_max)
+		f_rep  = repetition_frequency(fa, needed, d_frequency) if not result else None
+		if f_rep is None:
+			f_rep = d_frequency*math.ceil(needed/d_frequency)
+		fb 	  = min(stop_frequency, fa + max_tones*f_rep, f_rep*k_max)
+		first = max(1, math.floor(fa/f_rep + 1e-9) if not result else math.ceil(fa/f_rep - 1e-9)) 	# Sin tono de continua
+		k 	  = np.arange(first, math.ceil(fb/f_rep - 1e-9))
+		if k.size == 0:
+			break
+		result.append((f_rep, k*f_rep))
+		fa = (k[-1] + 1)*f_rep
+	return result
+
+
+def schroeder_phases(n):
+	"""Schroeder phases of n tones of equal amplitude"""
+	k = np.arange(1, n + 1)
+	return -np.pi*k*(k - 1)/n
+
+
+def multitone(f_rep, frequencies, points=PERIOD_POINTS):
+	"""One period of a multi-tone with Schroeder phases, normalised to +-1"""
+	t 	   = np.arange(points)/(points*f_rep)
+	phases = schroeder_phases(len(frequencies))
+	signal = np.zeros(points)
+	for frequency, phase in zip(frequencies, phases):
+		signal += np.cos(2*np.pi*frequency*t + phase)
+	return signal/np.max(np.abs(signal))
+
+
+def chirp(f_rep, frequencies, kind="linear", points=PERIOD_POINTS):
+	"""One period of a linear or log chirp from the first to the last frequency, normalised to +-1"""
+	T 	   = 1/f_rep
+	t 	   = np.arange(points)*T/points
+	f1, f2 = frequencies[0], frequencies[-1] + f_rep
+	if kind == "linear":
+		phase = 2*np.pi*(f1*t + (f2 - f1)*t**2/(2*T))
+	elif kind == "log":
+		phase = 2*np.pi*f1*T/np.log(f2/f1)*(np.exp(t/T*np.log(f2/f1)) - 1)
+	else:
+		raise ValueError(f"Unknown chirp {kind}")
+	return np.sin(phase)
+
+
+def crest_factor(signal):
+	"""Peak to RMS ratio"""
+	return np.max(np.abs(signal))/np.sqrt(np.mean(signal**2))
+
+
+def to_dac(signal):
+	"""Scale a signal of +-1 to the DAC values of the arbitrary memory"""
+	return np.rint(np.clip(signal, -1, 1)*DAC_MAX).astype(int)
+
+
+def upload_arbitrary(AFG_2225, signal, f_rep, voltaje_source):
+	"""Load one period in the volatile memory and output it at f_rep"""
+	values = ",".join(str(value) for value in to_dac(signal))
+	AFG_2225.write(f"DATA:DAC VOLATILE,0,{values}")
+	time.sleep(1)
+	AFG_2225.write(f"SOUR1:APPL:USER {f_rep}HZ,{voltaje_source},0")
+
+
+def deconvolve(waveform, f_rep, frequencies, reference=0):
+	"""Spectrum of each channel and transfer function to the reference channel at the tones"""
+	volts = np.atleast_2d(waveform.volts())
+	dt 	  = waveform.XRef
+
+	# Se usa un número entero de periodos de la excitación
+	n_period = 1/(f_rep*dt)
+	periods  = int(volts.shape[1] // n_period)
+	if periods < 1:
+		raise ValueError("The capture is shorter than one period of the excitation")
+	n = int(round(periods*n_period))
+
+	Y 	 = scipy.fft.rfft(volts[:, :n], axis=1, workers=-1)
+	bins = np.rint(np.asarray(frequencies)*n*dt).astype(int)
+	Y 	 = Y[:, bins]*(2/n)
+	info(f"Deconvolution of {len(bins)} tones over {periods} periods")
+	return Y, Y/Y[reference]
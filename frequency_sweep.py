@@ -20,16 +20,13 @@ Version	: 2.0
 
 # %% libreries
 import pyvisa
-import time 
 import os 
-import numpy as np
-from tqdm import tqdm
-import datetime
 import pyfiglet
 import logging
-from logging import info, error
-import pandas as pd
 import matplotlib.pyplot as plt
+from acquisition import BufferRing
+import catalog
+import sweep
 
 # logging configuration
 logging.basicConfig(format="[%(levelname)s] %(message)s")
@@ -38,41 +35,16 @@ logger.setLevel(logging.INFO)
 
 
 #%% Definitions
-def dictionary_measurements(osc, channel=1):
-	"""Create a dictionary of measurements' parameters"""
-	dict = {
-			"timescale" : osc.query_ascii_values(":TIM:SCAL?")[0],
-			"timeoffset" : osc.query_ascii_values(":TIM:OFFS?")[0],
-			"voltscale" : osc.query_ascii_values(':CHAN'+str(channel)+':SCAL?')[0],
-			"voltoffset" : osc.query_ascii_values(":CHAN"+str(channel)+":OFFS?")[0], # "voltoffset2" : osc.query_ascii_values(":CHAN2:OFFS?")[0],
-			"sample_rate" :osc.query_ascii_values('ACQuire:SRATe?')[0],
-			"XRef" :osc.query_ascii_values("WAVeform:XINCrement?")[0] ,
-			"YRef" :osc.query_ascii_values("WAVeform:YREFerence?")[0],
-			"dV" :osc.query_ascii_values(":WAVeform:YINCrement?")[0]
-	}	
-	return dict
-
-def CH_to_voltaje(data1, df_setup, channel=1):
-	"""Convert bit data to voltage"""
-	YRef 		= df_setup["YRef"][channel-1]
-	voltoffset  = df_setup["voltoffset"][channel-1]
-	dV 			= df_setup["dV"][channel-1]
-
-	return (data1-YRef)*dV # - voltoffset/2 # Se elimina la referencia, se escala en voltaje y se elimina offset de pantalla
-    
-fig, axs = plt.subplots(2, 1)
-
 # Define la función de actualización de subplots
-def update_plots(axs, t, df_measurements):
+def update_plots(axs, waveform):
 	# Agrega los nuevos datos a los subplots
-	axs[0].plot(t, df_measurements["CH1 V"], "k-", label="CH 1")
-	axs[1].plot(t, df_measurements["CH2 V"], "r-", label="CH 2")
+	t = waveform.time()
+	for ax, channel, volts in zip(axs, waveform.channels, waveform.volts()):
+		ax.plot(t, volts, "-", label=f"CH {channel}")
 
-	# Configura los límites de los ejes x e y
-	axs[0].set_xlim(0, 0.1)
-	# axs[0].set_ylim(0, 10)
-	axs[1].set_xlim(0, 0.1)
-	#axs[1].set_ylim(0, 10)
+		# Configura los límites de los ejes x e y
+		ax.set_xlim(0, 0.1)
+		# ax.set_ylim(0, 10)
 
 	# Actualiza la figura
 	plt.legend()
@@ -82,7 +54,9 @@ def update_plots(axs, t, df_measurements):
 #%% Global configuration
 name_measurements 	= "Barrido cilindro 7.5cm EMAR 1k-1.1kHz"
 enable_plot 		= False #False
+save_csv 			= False # True: save also the voltage in csv, False: only raw data (.npy)
 time_waiting 		= 1 	# Seconds
+channels 			= [1, 2] # Canales del MSO7024 a adquirir (1-4)
 
 start_frequency = 30000 # Hz
 stop_frequency 	= 40000 # Hz
@@ -93,152 +67,49 @@ voltaje_source 	= 20 	# V
 sample_rate 	= '100k' #'100k' 	
 time_base 		= '0.1' #'0.1'
 
-df_global_config = pd.DataFrame({ 
-			"start_frequency": [start_frequency], 
-			"stop_frequency": [stop_frequency], 
-			"d_frequency": [d_frequency],
-			"voltaje_source": [voltaje_source],
-			"sample_rate": [sample_rate],
-			"time_base": [time_base]
-		})
+plan = sweep.make_plan(
+			name_measurements = name_measurements,
+			start_frequency = start_frequency,
+			stop_frequency = stop_frequency,
+			d_frequency = d_frequency,
+			voltaje_source = voltaje_source,
+			sample_rate = sample_rate,
+			time_base = time_base,
+			channels = channels,
+			time_waiting = time_waiting,
+			save_csv = save_csv
+		)
 
 #%%
 os.system('cls')
 rm = pyvisa.ResourceManager()
 # print(rm.list_resources())
-directory_output = ""
-
-now = datetime.datetime.now()
-datestr   =  now.strftime("%Y-%m-%d_%H_%M")
-file_name =  "./med/" + datestr + " " + name_measurements + "/" #"./config/"+datestr+"_configuracion.txt"
-info("Creado carpeta " + file_name)
-
-# Verificar si la carpeta ya existe
-if not os.path.exists(file_name):
-    # Crear la carpeta si no existe
-    os.makedirs(file_name)
-    print("Carpeta creada exitosamente.")
-else:
-    print("La carpeta ya existe.")
 
-info("Guardando configuracion")
-df_global_config.to_csv(file_name + "global_configuration.csv")
+con = catalog.connect()
+file_name, run_id = sweep.create_run(plan, con)
 
-info("Configurando equipos")
-AFG_2225 		 = rm.open_resource('ASRL3::INSTR')
-AFG_2225.timeout = 10000  # set timeout to 10 seconds
-
-MSO7024 = rm.open_resource('USB0::0x1AB1::0x0514::DS7F221000027::INSTR')
-MSO7024.timeout = 5000
+AFG_2225, MSO7024 = sweep.open_instruments(rm)
 
 #%%
 result = pyfiglet.figlet_format("Frequency Sweep", font = "univers", width=1000 ) # roman
 print(result)
 
-bar = tqdm(range(start_frequency, stop_frequency, d_frequency))
-vec_sample = np.zeros(len(range(start_frequency, stop_frequency, d_frequency)))
-
-MSO7024.write('CLE')
+sweep.start_instruments(AFG_2225, MSO7024)
+sweep.configure_oscilloscope(MSO7024, plan)
 
-AFG_2225.write('OUTP1:LOAD INFinity') # High Z
-AFG_2225.write('OUTP1 ON')
-time.sleep(5)
+# Buffers reused between points
+ring = BufferRing()
 
-AFG_2225.write(f'SOUR1:APPL:SIN {start_frequency}HZ,{voltaje_source},0')
+on_point = None
+if enable_plot==True:
+	fig, axs = plt.subplots(len(channels), 1, squeeze=False)
+	axs = axs[:, 0]
+	on_point = lambda frequency, waveform: update_plots(axs, waveform)
 
 # %% Loop principal
-for index, frequency in enumerate(bar): #range(start_frequency, stop_frequency, d_frequency):
-	bar.set_description(f"Generando frecuencia {frequency} Hz" )
-
-	AFG_2225.write(f'SOUR1:APPL:SIN {frequency}HZ,{voltaje_source},0')
-	# time.sleep(0.5)
-	MSO7024.write('RUN')
-	time.sleep(1)
-	MSO7024.write(f'TIMebase:MAIN:SCALe {time_base}')
-	time.sleep(0.5)
-	MSO7024.write(f"ACQuire:MDEPth {sample_rate}")
-	time.sleep(3)
-	MSO7024.write('TRIGger:EDGE:SOURce CHANnel2')
-	time.sleep(0.5)
-	MSO7024.write('TRIGger:EDGE:LEVel 0.16')
-	time.sleep(3)
-	MSO7024.write('STOP')
-	time.sleep(2)
-	
-	try:
-		vec_sample[index] = MSO7024.query('ACQuire:SRATe?')
-	except:
-		pass
-
-	# get data from oscilloscope
-	MSO7024.write("WAV:MODE RAW")  #BYTE  ASCii, Establecer el modo de adquisición de puntos
-
-	# CH1
-	print("")
-	info("Getting data from CH1")
-	MSO7024.write("WAV:SOUR CHAN1")  # Solicitar la forma de onda del canal 1
-	dictionary_measurements1 = dictionary_measurements(MSO7024, channel=1)
-	# Convertir los valores del diccionario a listas
-	dictionary_measurements1 = {k: [v] for k, v in dictionary_measurements1.items()}
-	try:
-		data1 = MSO7024.query_binary_values("WAV:DATA?", datatype='B', container=np.array)
-	except:
-		error("Error getting CH1")
-
-	time.sleep(1)
-
-	# CH2
-	info("Getting data from CH2")
-	MSO7024.write("WAV:SOUR CHAN2")  # Solicitar la forma de onda del canal 2
-	dictionary_measurements2 = dictionary_measurements(MSO7024, channel=2)
-	# Convertir los valores del diccionario a listas
-	dictionary_measurements2 = {k: v for k, v in dictionary_measurements2.items()}
-
-	try:
-		data2 = MSO7024.query_binary_values("WAV:DATA?", datatype='B', container=np.array)
-	except:
-		error("Error getting CH2")
-
-	# Create a dataframe with the configuration of measurements
-	info('Creating dataframe')
-	df_setup = pd.DataFrame(dictionary_measurements1)
-	df_setup = pd.concat([df_setup, pd.DataFrame(dictionary_measurements2, index=[0])], ignore_index=True)
-
-
-	data_size = len(data1)
-
-	t = np.linspace(0, (len(data1)-1)*df_setup["XRef"][0], len(data1))
-
-	info("Converting data to voltage")
-	df_measurements = pd.DataFrame({
-									"Tiempo s": t, 
-									"CH1 V": CH_to_voltaje(data1, df_setup, channel=1),
-									"CH2 V": CH_to_voltaje(data2, df_setup, channel=2)
-								})
-
-	# %% Plot
-	if enable_plot==True:
-		info("Plot measurements")
-		update_plots(axs, t, df_measurements)
-
-	# print(data_size)
-	# print(np.max(df_measurements["CH1 V"]))
-
-	info("Saving measurements " + str(frequency) + " Hz")
-	# file_name =  "./med/" + datestr + "/"
-	df_measurements.to_csv(file_name + str(frequency) + ".csv")
-	df_setup.to_csv(file_name +  "setup_measurements_" + str(frequency) + ".csv")
-
-	time.sleep(time_waiting)
-
-info("Apagando Generador")
-AFG_2225.write('OUTP1 OFF')
-
+sweep.run_plan(AFG_2225, MSO7024, ring, con, plan, file_name, run_id, sweep.frequencies(plan), on_point)
 
 #  %% Cerrando al comunicación con los instrumentos
-print('Closing communication', end='... ')
-AFG_2225.close()
-print('AFG-2225 closed. ', end='')
-MSO7024.close()
-print('MSO7024 closed')
-print('Finished!!!')
\ No newline at end of file
+sweep.close_instruments(AFG_2225, MSO7024)
+con.close()
+print('Finished!!!')
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Title: Pyramid
+
+Description: Multi-resolution min/max/mean pyramid of the captures, to browse
+long sweeps without loading the full-depth data. After each point is saved,
+the raw bit data (channels, points) is reduced by LEVELS (1:16, 1:256,
+1:4096) and each level is saved next to it as <name>_pyramid_<factor>.npy,
+with the scale of each channel in <name>_pyramid.npz. read_pyramid() returns
+the coarsest level that covers a pixel width in a time window, reading only
+that window of the memory-mapped level, and heatmap() builds a frequency x
+time image of a sweep.
+
+"""
+
+# %% libreries
+import os
+import re
+import logging
+from logging import info
+import numpy as np
+import pandas as pd
+
+from acquisition import load_waveform
+
+#%% Definitions
+LEVELS = (16, 256, 4096)
+
+
+def reduce_level(minimum, maximum, total, factor):
+	"""Reduce min/max/sum (channels, n) by factor, the last block may be partial"""
+	n 	  = minimum.shape[1]
+	full  = n // factor*factor
+	parts = [(minimum[:, :full].reshape(len(minimum), -1, factor).min(axis=2),
+			  maximum[:, :full].reshape(len(maximum), -1, factor).max(axis=2),
+			  total[:, :full].reshape(len(total), -1, factor).sum(axis=2, dtype=np.float64))]
+	if full < n:
+		parts.append((minimum[:, full:].min(axis=1, keepdims=True),
+					  maximum[:, full:].max(axis=1, keepdims=True),
+					  total[:, full:].sum(axis=1, keepdims=True, dtype=np.float64)))
+	return [np.concatenate(p, axis=1) for p in zip(*parts)]
+
+
+def level_dtype(channels):
+	"""Record of a pyramid level: min, max (bits) and mean of each channel"""
+	return np.dtype([("min", np.uint8, (channels,)), ("max", np.uint8, (channels,)), ("mean", np.float32, (channels,))])
+
+
+def build_pyramid(file_name, waveform, levels=LEVELS):
+	"""Save the min/max/mean pyramid of a waveform next to file_name
+
+	Each level is saved as file_name + '_pyramid_<factor>.npy' (one record per
+	sample, see level_dtype) and the scale as file_name + '_pyramid.npz', written last.
+	"""
+	raw 	= np.atleast_2d(waveform.raw)
+	n 		= raw.shape[1]
+	data 	= {
+			"points" 	: np.array(n),
+			"levels" 	: np.array(levels),
+			"XRef" 		: np.array(waveform.XRef),
+			"t0" 		: np.array(waveform.t0),
+			"YRef" 		: np.atleast_1d(waveform.YRef).ravel(),
+			"dV" 		: np.atleast_1d(waveform.dV).ravel(),
+			"channels" 	: np.array(waveform.channels if waveform.channels is not None else range(1, len(raw) + 1))
+	}
+
+	# Cada nivel se calcula a partir del anterior (suma para la media exacta)
+	minimum, maximum, total, previous = raw, raw, raw, 1
+	for factor in sorted(levels):
+		minimum, maximum, total = reduce_level(minimum, maximum, total, factor//previous)
+		counts 	 = np.minimum(factor, n - np.arange(minimum.shape[1])*factor)
+		previous = factor
+		level 	 = np.empty(minimum.shape[1], dtype=level_dtype(len(raw)))
+		level["min"], level["max"], level["mean"] = minimum.T, maximum.T, (total/counts).T
+		np.save(f"{file_name}_pyramid_{factor}.npy", level)
+	np.savez(file_name + "_pyramid.npz", **data)
+
+
+def build_folder(folder):
+	"""Build the missing pyramids of the points saved in a folder"""
+	for file in sorted(os.listdir(folder)):
+		match = re.fullmatch(r"((?:segment_)?)(\d+(?:\.\d+)?)\.npy", file)
+		if match is None or os.path.exists(os.path.join(folder, file[:-4] + "_pyramid.npz")):
+			continue
+		file_setup = os.path.join(folder, ("setup_segment_" if match.group(1) else "setup_measurements_") + match.group(2) + ".csv")
+		if not os.path.exists(file_setup):
+			continue
+		build_pyramid(os.path.join(folder, file[:-4]), load_waveform(os.path.join(folder, file), pd.read_csv(file_setup, index_col=0)))
+		info("Pyramid " + os.path.join(folder, file))
+
+
+def read_info(file_name):
+	"""Points, levels, XRef, t0, YRef and dV (channels, 1) of a pyramid"""
+	with np.load(file_name + "_pyramid.npz") as pyramid:
+		return (int(pyramid["points"]), sorted(int(factor) for factor in pyramid["levels"]), float(pyramid["XRef"]),
+				float(pyramid["t0"]), pyramid["YRef"].reshape(-1, 1), pyramid["dV"].reshape(-1, 1))
+
+
+def read_level(file_name, width, t_start=None, t_stop=None):
+	"""Like read_pyramid, plus the number of raw samples of each sample (counts)"""
+	n, levels, XRef, t0, YRef, dV = read_info(file_name)
+	t_start = t0 if t_start is None else t_start
+	t_stop 	= t0 + n*XRef if t_stop is None else t_stop
+	first 	= max(0, int((t_start - t0)/XRef))
+	last 	= max(first, min(n, int(np.ceil((t_stop - t0)/XRef))))
+
+	# Solo se leen del disco las muestras [a:b] del nivel
+	for factor in reversed(levels):
+		if (last - first)/factor >= width:
+			a, b 	= first//factor, -(-last//factor)
+			level 	= np.load(f"{file_name}_pyramid_{factor}.npy", mmap_mode="r")[a:b]
+			t 		= t0 + (np.arange(a, b)*factor + (factor - 1)/2)*XRef
+			counts 	= np.minimum(factor, n - np.arange(a, b)*factor)
+			minimum = (level["min"].T - YRef)*dV
+			maximum = (level["max"].T - YRef)*dV
+			mean 	= (level["mean"].T - YRef)*dV
+			return t, minimum, maximum, mean, counts
+
+	raw 	= np.atleast_2d(np.load(file_name + ".npy", mmap_mode="r"))[:, first:last]
+	volts 	= (raw - YRef.astype(np.float32))*dV.astype(np.float32)
+	return t0 + np.arange(first, last)*XRef, volts, volts, volts, np.ones(last - first, dtype=int)
+
+
+def read_pyramid(file_name, width, t_start=None, t_stop=None):
+	"""Coarsest level with at least width samples in [t_start, t_stop]
+
+	Return (t, minimum, maximum, mean) in seconds and volts, (channels, samples).
+	Only the samples of the window are read from the memory-mapped level, and
+	below the finest level the raw data is read from file_name + '.npy'.
+	"""
+	return read_level(file_name, width, t_start, t_stop)[:4]
+
+
+def heatmap(folder, width, channel=0, t_start=None, t_stop=None, statistic="max"):
+	"""Frequency x time image of a sweep from the pyramids: (frequencies, t, image)
+
+	channel is the index of the channel in the saved data and statistic is min, max or mean.
+	The rows of a broadband run are its segments, by their first tone.
+	The samples of the level are binned in width columns and reduced with the
+	statistic (the mean is weighted by the raw samples of each sample), so the
+	extrema are kept.
+	"""
+	matches 	= [re.fullmatch(r"((?:segment_)?(\d+(?:\.\d+)?))_pyramid\.npz", file) for file in os.listdir(folder)]
+	names 		= {float(match.group(2)): match.group(1) for match in matches if match is not None}
+	frequencies = sorted(names)
+	if not frequencies:
+		raise ValueError(f"No pyramids in {folder} (run 'python pyramid.py' to build them)")
+
+	image, t = np.full((len(frequencies), width), np.nan, dtype=np.float32), None
+	for row, frequency in enumerate(frequencies):
+		file_name = os.path.join(folder, names[frequency])
+		n, levels, XRef, t0, YRef, dV = read_info(file_name)
+		t_a = t0 if t_start is None else t_start
+		t_b = t0 + n*XRef if t_stop is None else t_stop
+		if t is None:
+			t = t_a + (np.arange(width) + 0.5)*(t_b - t_a)/width
+
+		t_level, minimum, maximum, mean, counts = read_level(file_name, width, t_start, t_stop)
+		columns = np.clip(((t_level - t_a)/(t_b - t_a)*width).astype(int), 0, width - 1)
+		if len(columns) == 0:
+			continue
+		used, index = np.unique(columns, return_index=True)
+		if statistic == "min":
+			image[row, used] = np.minimum.reduceat(minimum[channel], index)
+		elif statistic == "max":
+			image[row, used] = np.maximum.reduceat(maximum[channel], index)
+		elif statistic == "mean":
+			image[row, used] = np.add.reduceat(mean[channel]*counts, index)/np.add.reduceat(counts, index)
+		else:
+			raise ValueError(f"Unknown statistic {statistic}")
+	return np.array(frequencies), t, image
+
+
+#%% Pyramids of the existing folders
+if __name__ == "__main__":
+	logging.basicConfig(format="[%(levelname)s] %(message)s")
+	logging.getLogger().setLevel(logging.INFO)
+	for folder in sorted(os.listdir("./med/")):
+		if os.path.isdir(os.path.join("./med/", folder)):
+			build_folder(os.path.join("./med/", folder))
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Title: Scheduler
+
+Description: Unattended batch of frequency sweeps. A queue of plans (see
+sweep.DEFAULT_PLAN) is saved in ./med/queue.json and run back to back on one
+open session of the AFG_2225 and the MSO7024: the warm-up is done once and
+only the settings that change are written between plans. The progress of
+each plan is saved after every point, so the queue resumes after a restart,
+and the projected completion time is computed from the measured rate.
+
+The queue file is only written under a lock (queue.json.lock) and re-read
+before each change, so plans can be added while the queue is running; they
+are run after the current plan. A plan with points that could not be
+measured ends as "failed".
+
+Usage:
+	python scheduler.py add plans.json 	# add a plan (JSON object) or a list of plans
+	python scheduler.py status 			# show the queue and the projected completion
+	python scheduler.py run 			# run the pending plans
+
+"""
+
+# %% libreries
+import os
+import sys
+import json
+import time
+import uuid
+import datetime
+import contextlib
+import logging
+from logging import info, error
+
+from acquisition import BufferRing
+import catalog
+import sweep
+
+#%% Definitions
+QUEUE_FILE 	 = "./med/queue.json"
+LOCK_TIMEOUT = 30 	# Segundos tras los que se descarta el lock de un proceso detenido
+
+
+def load_queue(file_name=QUEUE_FILE):
+	"""Load the queue, empty if it does not exist"""
+	if not os.path.exists(file_name):
+		return {"plans": []}
+	with open(file_name, "r", encoding="utf-8") as file:
+		return json.load(file)
+
+
+def save_queue(queue, file_name=QUEUE_FILE):
+	"""Save the queue replacing the file in one step"""
+	os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+	with open(file_name + ".tmp", "w", encoding="utf-8") as file:
+		json.dump(queue, file, indent=4, ensure_ascii=False)
+	os.replace(file_name + ".tmp", file_name)
+
+
+@contextlib.contextmanager
+def queue_lock(file_name=QUEUE_FILE, timeout=LOCK_TIMEOUT):
+	"""Hold file_name + '.lock' so that add and run do not write the queue at the same time"""
+	os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+	lock = file_name + ".lock"
+	while True:
+		try:
+			os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+			break
+		except FileExistsError:
+			try:
+				if time.time() - os.path.getmtime(lock) > timeout:
+					error("Removing stale lock " + lock)
+					os.remove(lock)
+			except FileNotFoundError:
+				pass
+			time.sleep(0.05)
+	try:
+		yield
+	finally:
+		os.remove(lock)
+
+
+@contextlib.contextmanager
+def edit_queue(file_name=QUEUE_FILE):
+	"""Load the queue under the lock and save it on exit"""
+	with queue_lock(file_name):
+		queue = load_queue(file_name)
+		for entry in queue["plans"]:
+			entry.setdefault("id", uuid.uuid4().hex) 	# Colas guardadas antes del id
+		yield queue
+		save_queue(queue, file_name)
+
+
+def update_entry(entry_id, file_name=QUEUE_FILE, **values):
+	"""Update only the entry entry_id in the queue file, return the queue saved"""
+	with edit_queue(file_name) as queue:
+		for entry in queue["plans"]:
+			if entry["id"] == entry_id:
+				entry.update(values)
+	return queue
+
+
+def add_plan(file_name=QUEUE_FILE, **plan):
+	"""Add a plan to the queue"""
+	plan = sweep.make_plan(**plan)
+	if plan["excitation"] != "sine":
+		sweep.check_resolution(plan)
+	with edit_queue(file_name) as queue:
+		queue["plans"].append({
+				"id" 				: uuid.uuid4().hex,
+				"plan" 				: plan,
+				"status" 			: "pending",
+				"added" 			: datetime.datetime.now().isoformat(sep=" ", timespec="seconds"),
+				"folder" 			: None,
+				"run_id" 			: None,
+				"last_frequency" 	: None,
+				"seconds_per_point" : None,
+				"missed" 			: 0
+		})
+	info("Plan added: " + plan["name_measurements"])
+
+
+def next_entry(file_name=QUEUE_FILE):
+	"""Plan to run next: the running one (after a restart), else the first pending, else None"""
+	with edit_queue(file_name) as queue:
+		for status in ("running", "pending"):
+			for entry in queue["plans"]:
+				if entry["status"] == status:
+					return entry
+	return None
+
+
+def remaining_points(entry):
+	"""Frequencies of a plan not measured yet"""
+	points = sweep.frequencies(entry["plan"])
+	if entry["last_frequency"] is None:
+		return points
+	return [frequency for frequency in points if frequency > entry["last_frequency"]]
+
+
+def seconds_per_point(queue, entry):
+	"""Measured rate of the plan, or of the last plan with the same acquisition settings"""
+	if entry["seconds_per_point"] is not None:
+		return entry["seconds_per_point"]
+	keys 	 = ("sample_rate", "time_base", "time_acquire", "time_waiting")
+	measured = [e for e in queue["plans"] if e["seconds_per_point"] is not None]
+	similar  = [e for e in measured if all(e["plan"][k] == entry["plan"][k] for k in keys)]
+	if similar:
+		return similar[-1]["seconds_per_point"]
+	if measured:
+		return measured[-1]["seconds_per_point"]
+	return None
+
+
+def projected_completion(queue, now=None):
+	"""Projected end of the pending plans, None if there is no measured rate"""
+	now 	= now or datetime.datetime.now()
+	seconds = 0.0
+	for entry in queue["plans"]:
+		if entry["status"] not in ("pending", "running"):
+			continue
+		rate = seconds_per_point(queue, entry)
+		if rate is None:
+			return None
+		seconds += rate*len(remaining_points(entry))
+	return now + datetime.timedelta(seconds=seconds)
+
+
+def status(file_name=QUEUE_FILE):
+	"""Print the queue and the projected completion"""
+	queue = load_queue(file_name)
+	for index, entry in enumerate(queue["plans"]):
+		plan = entry["plan"]
+		rate = seconds_per_point(queue, entry)
+		print(f'{index:3d} {entry["status"]:8s} {plan["name_measurements"]} '
+			  f'{plan["start_frequency"]}-{plan["stop_frequency"]} Hz, {plan["voltaje_source"]} V, '
+			  f'{len(remaining_points(entry))} points left' + (f', {rate:.1f} s/point' if rate is not None else '') +
+			  (f', {entry["missed"]} points missed' if entry.get("missed") else ''))
+	end = projected_completion(queue)
+	print("Projected completion: " + (end.strftime("%Y-%m-%d %H:%M") if end is not None else "unknown"))
+
+
+def run_queue(rm, file_name=QUEUE_FILE):
+	"""Run the pending plans of the queue on one session of the instruments
+
+	The queue is re-read between plans, so the plans added while it runs are
+	run too.
+	"""
+	entry = next_entry(file_name)
+	if entry is None:
+		info("No pending plans")
+		return
+
+	con 			  = catalog.connect()
+	AFG_2225, MSO7024 = sweep.open_instruments(rm)
+	sweep.start_instruments(AFG_2225, MSO7024)
+	ring 	 = BufferRing()
+	settings = None
+
+	try:
+		while entry is not None:
+			plan = entry["plan"]
+			if entry["status"] == "running" and entry["folder"] is not None and os.path.exists(entry["folder"]):
+				info("Resuming " + entry["folder"])
+				file_name_run, run_id = entry["folder"], entry["run_id"]
+			else:
+				file_name_run, run_id = sweep.create_run(plan, con)
+				entry.update(status="running", folder=file_name_run, run_id=run_id, last_frequency=None)
+				update_entry(entry["id"], file_name, status="running", folder=file_name_run, run_id=run_id, last_frequency=None)
+
+			settings = sweep.configure_oscilloscope(MSO7024, plan, settings)
+			last 	 = [time.monotonic()]
+
+			def on_point(frequency, waveform):
+				"""Save the progress and the measured rate"""
+				now 	= time.monotonic()
+				elapsed = now - last[0]
+				last[0] = now
+				rate 	= entry["seconds_per_point"]
+				entry["seconds_per_point"] = elapsed if rate is None else 0.8*rate + 0.2*elapsed
+				entry["last_frequency"]    = frequency
+				queue = update_entry(entry["id"], file_name, seconds_per_point=entry["seconds_per_point"], last_frequency=frequency)
+				end = projected_completion(queue)
+				if end is not None:
+					info("Projected completion " + end.strftime("%Y-%m-%d %H:%M"))
+
+			try:
+				missed = sweep.run_plan(AFG_2225, MSO7024, ring, con, plan, file_name_run, run_id, remaining_points(entry), on_point)
+			except Exception:
+				error(f"Plan {plan['name_measurements']} failed", exc_info=True)
+				update_entry(entry["id"], file_name, status="failed")
+			else:
+				if missed:
+					error(f"Plan {plan['name_measurements']} failed: {missed} points missed")
+				update_entry(entry["id"], file_name, status="failed" if missed else "done", missed=entry.get("missed", 0) + missed)
+			entry = next_entry(file_name)
+	finally:
+		sweep.close_instruments(AFG_2225, MSO7024)
+		con.close()
+
+
+#%% Command line
+if __name__ == "__main__":
+	logging.basicConfig(format="[%(levelname)s] %(message)s")
+	logging.getLogger().setLevel(logging.INFO)
+
+	command = sys.argv[1] if len(sys.argv) > 1 else "status"
+	if command == "add":
+		with open(sys.argv[2], "r", encoding="utf-8") as file:
+			plans = json.load(file)
+		for plan in plans if isinstance(plans, list) else [plans]:
+			add_plan(**plan)
+	elif command == "status":
+		status()
+	elif command == "run":
+		import pyvisa
+		import pyfiglet
+
+		print(pyfiglet.figlet_format("Frequency Sweep", font = "univers", width=1000 )) # roman
+		run_queue(pyvisa.ResourceManager())
+		print('Finished!!!')
+	else:
+		print(__doc__)
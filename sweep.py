@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Title: Sweep
+
+Description: Steps of a frequency sweep with the AFG_2225 and the MSO7024,
+shared by frequency_sweep.py and scheduler.py. A sweep is described by a
+plan (dictionary with the keys of DEFAULT_PLAN); the instruments are opened
+and warmed up once, and each plan only writes the settings that change.
+
+The excitation of a plan is a sine per frequency ("sine") or a broadband
+segment per capture ("multitone", "chirp" or "chirp_log", see excitation.py).
+
+"""
+
+# %% libreries
+import time
+import os
+import datetime
+from logging import info, error, warning
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from acquisition import fetch_channels, save_waveform
+from analysis import tone_response
+import excitation
+import pyramid
+import catalog
+
+#%% Definitions
+MAX_FAILURES = 5 	# Puntos consecutivos con error tras los que se detiene el plan
+
+DEFAULT_PLAN = {
+		"name_measurements" : "Barrido",
+		"start_frequency" 	: 30000, 	# Hz
+		"stop_frequency" 	: 40000, 	# Hz
+		"d_frequency" 		: 2,
+		"voltaje_source" 	: 20, 		# V
+		"sample_rate" 		: '100k', 	# Memory Depth
+		"time_base" 		: '0.1', 	# s/div
+		"channels" 			: [1, 2],
+		"trigger_source" 	: 2,
+		"trigger_level" 	: 0.16, 	# V
+		"time_acquire" 		: 8, 		# Seconds between RUN and STOP
+		"time_waiting" 		: 1, 		# Seconds
+		"save_csv" 			: False,
+		"excitation" 		: "sine", 	# sine|multitone|chirp|chirp_log
+		"max_tones" 		: 256, 		# Tonos por segmento (multitone/chirp)
+		"reference_channel" : 1 		# Canal de la excitación (multitone/chirp)
+}
+
+# Settings of the oscilloscope and the time (s) they need to be applied
+OSCILLOSCOPE_SETTINGS = {
+		"time_base" 		: ("TIMebase:MAIN:SCALe {}", 0.5),
+		"sample_rate" 		: ("ACQuire:MDEPth {}", 3),
+		"trigger_source" 	: ("TRIGger:EDGE:SOURce CHANnel{}", 0.5),
+		"trigger_level" 	: ("TRIGger:EDGE:LEVel {}", 3)
+}
+
+
+def make_plan(**plan):
+	"""Complete a plan with the default values"""
+	unknown = set(plan) - set(DEFAULT_PLAN)
+	if unknown:
+		raise KeyError(f"Unknown plan keys {sorted(unknown)}")
+	return {**DEFAULT_PLAN, **plan}
+
+
+def frequencies(plan):
+	"""Frequencies (Hz) of a plan, or first tone of each segment for a broadband excitation"""
+	if plan["excitation"] == "sine":
+		return range(plan["start_frequency"], plan["stop_frequency"], plan["d_frequency"])
+	return [tones[0].item() for f_rep, tones in broadband_segments(plan)]
+
+
+def broadband_segments(plan):
+	"""Segments (f_rep, tones) of a broadband plan"""
+	return excitation.segments(plan["start_frequency"], plan["stop_frequency"], plan["d_frequency"], plan["max_tones"])
+
+
+def check_resolution(plan):
+	"""Warn when the tones of a broadband plan are coarser than d_frequency, return the segments"""
+	tiles  = broadband_segments(plan)
+	f_reps = [f_rep for f_rep, tones in tiles]
+	if tiles and max(f_reps) > plan["d_frequency"]:
+		warning(f"Tone spacing {min(f_reps)}-{max(f_reps)} Hz from {tiles[0][1][0]} Hz is coarser than "
+				f"d_frequency {plan['d_frequency']} Hz (arbitrary memory of {excitation.PERIOD_POINTS} points)")
+	return tiles
+
+
+def open_instruments(rm):
+	"""Open the AFG_2225 and the MSO7024"""
+	info("Configurando equipos")
+	AFG_2225 		 = rm.open_resource('ASRL3::INSTR')
+	AFG_2225.timeout = 10000  # set timeout to 10 seconds
+
+	MSO7024 = rm.open_resource('USB0::0x1AB1::0x0514::DS7F221000027::INSTR')
+	MSO7024.timeout = 5000
+	return AFG_2225, MSO7024
+
+
+def start_instruments(AFG_2225, MSO7024):
+	"""Clear the oscilloscope and turn on the generator output (warm-up)"""
+	MSO7024.write('CLE')
+
+	AFG_2225.write('OUTP1:LOAD INFinity') # High Z
+	AFG_2225.write('OUTP1 ON')
+	time.sleep(5)
+
+
+def close_instruments(AFG_2225, MSO7024):
+	"""Turn off the generator and close the communication"""
+	info("Apagando Generador")
+	AFG_2225.write('OUTP1 OFF')
+
+	print('Closing communication', end='... ')
+	AFG_2225.close()
+	print('AFG-2225 closed. ', end='')
+	MSO7024.close()
+	print('MSO7024 closed')
+
+
+def configure_oscilloscope(MSO7024, plan, current=None):
+	"""Write the settings of the plan that differ from current, return the settings applied"""
+	current = dict(current or {})
+	MSO7024.write('RUN')
+	time.sleep(1)
+	for key, (command, delay) in OSCILLOSCOPE_SETTINGS.items():
+		if current.get(key) != plan[key]:
+			MSO7024.write(command.format(plan[key]))
+			time.sleep(delay)
+			current[key] = plan[key]
+	return current
+
+
+def create_run(plan, con, directory="./med/"):
+	"""Create the folder of a run, save its configuration and add it to the catalog"""
+	now 	  = datetime.datetime.now()
+	file_name = directory + now.strftime("%Y-%m-%d_%H_%M") + " " + plan["name_measurements"] + "/"
+
+	# Cada corrida tiene su carpeta: se agregan los segundos y un contador si ya existe
+	if os.path.exists(file_name):
+		file_name = directory + now.strftime("%Y-%m-%d_%H_%M_%S") + " " + plan["name_measurements"] + "/"
+	counter = 2
+	while os.path.exists(file_name):
+		file_name = directory + now.strftime("%Y-%m-%d_%H_%M_%S") + " " + plan["name_measurements"] + f" ({counter})/"
+		counter += 1
+	os.makedirs(file_name)
+	info("Creado carpeta " + file_name)
+
+	df_global_config = pd.DataFrame({
+				"start_frequency": [plan["start_frequency"]],
+				"stop_frequency": [plan["stop_frequency"]],
+				"d_frequency": [plan["d_frequency"]],
+				"voltaje_source": [plan["voltaje_source"]],
+				"sample_rate": [plan["sample_rate"]],
+				"time_base": [plan["time_base"]],
+				"channels": [" ".join(str(channel) for channel in plan["channels"])],
+				"excitation": [plan["excitation"]]
+			})
+	info("Guardando configuracion")
+	df_global_config.to_csv(file_name + "global_configuration.csv")
+	run_id = catalog.add_run(con, file_name, df_global_config)
+	return file_name, run_id
+
+
+def acquire(MSO7024, ring, plan):
+	"""Acquire the channels of the plan with the current excitation"""
+	MSO7024.write('RUN')
+	time.sleep(plan["time_acquire"])
+	MSO7024.write('STOP')
+	time.sleep(2)
+
+	# get data from oscilloscope
+	MSO7024.write("WAV:MODE RAW")  #BYTE  ASCii, Establecer el modo de adquisición de puntos
+	info("Getting data from CH " + ", ".join(str(channel) for channel in plan["channels"]))
+	return fetch_channels(MSO7024, ring, plan["channels"])
+
+
+def measure_point(AFG_2225, MSO7024, ring, plan, frequency):
+	"""Generate frequency, acquire the channels of the plan and analyse the response"""
+	AFG_2225.write(f'SOUR1:APPL:SIN {frequency}HZ,{plan["voltaje_source"]},0')
+	waveform, df_setup = acquire(MSO7024, ring, plan)
+
+	info("Analysing response")
+	df_setup["frequency"] = frequency
+	df_setup["amplitude"], df_setup["phase"] = tone_response(waveform, frequency)
+	return waveform, df_setup
+
+
+def save_point(file_name, frequency, waveform, df_setup, con, run_id, save_csv=False):
+	"""Save the raw data, pyramid and setup of a point and add it to the catalog"""
+	info("Saving measurements " + str(frequency) + " Hz")
+	save_waveform(file_name + str(frequency) + ".npy", waveform)
+	pyramid.build_pyramid(file_name + str(frequency), waveform)
+	if save_csv==True:
+		info("Converting data to voltage")
+		df_measurements = pd.DataFrame(waveform.volts().T, columns=[f"CH{channel} V" for channel in waveform.channels], copy=False)
+		df_measurements.insert(0, "Tiempo s", waveform.time())
+		df_measurements.to_csv(file_name + str(frequency) + ".csv")
+	df_setup.to_csv(file_name +  "setup_measurements_" + str(frequency) + ".csv")
+	catalog.add_point(con, run_id, frequency, df_setup)
+
+
+def run_plan(AFG_2225, MSO7024, ring, con, plan, file_name, run_id, points, on_point=None, max_failures=MAX_FAILURES):
+	"""Measure and save the frequencies in points, calling on_point(frequency, waveform) after each one
+
+	Return the number of points that could not be measured, and raise
+	RuntimeError after max_failures consecutive ones (instrument not responding).
+	"""
+	if len(points) == 0:
+		return 0
+	if plan["excitation"] != "sine":
+		return run_broadband(AFG_2225, MSO7024, ring, con, plan, file_name, run_id, points, on_point, max_failures)
+	AFG_2225.write(f'SOUR1:APPL:SIN {points[0]}HZ,{plan["voltaje_source"]},0')
+
+	missed, consecutive = 0, 0
+	bar = tqdm(points)
+	for frequency in bar:
+		bar.set_description(f"Generando frecuencia {frequency} Hz" )
+		print("")
+		try:
+			waveform, df_setup = measure_point(AFG_2225, MSO7024, ring, plan, frequency)
+		except Exception as e:
+			error("Error getting data " + str(frequency) + " Hz", exc_info=True)
+			missed, consecutive = missed + 1, consecutive + 1
+			if consecutive >= max_failures:
+				raise RuntimeError(f"{consecutive} consecutive points failed, last at {frequency} Hz") from e
+			continue
+		consecutive = 0
+
+		save_point(file_name, frequency, waveform, df_setup, con, run_id, plan["save_csv"])
+		if on_point is not None:
+			on_point(frequency, waveform)
+
+		time.sleep(plan["time_waiting"])
+	if missed:
+		error(f"{missed} of {len(points)} points could not be measured")
+	return missed
+
+
+def measure_segment(AFG_2225, MSO7024, ring, plan, f_rep, tones):
+	"""Upload the broadband excitation of a segment, acquire and deconvolve the response at the tones"""
+	if plan["excitation"] == "multitone":
+		signal = excitation.multitone(f_rep, tones)
+	else:
+		signal = excitation.chirp(f_rep, tones, kind="log" if plan["excitation"] == "chirp_log" else "linear")
+	info(f"Uploading {plan['excitation']} of {len(tones)} tones, f_rep {f_rep} Hz, crest factor {excitation.crest_factor(signal):.2f}")
+	excitation.upload_arbitrary(AFG_2225, signal, f_rep, plan["voltaje_source"])
+	waveform, df_setup = acquire(MSO7024, ring, plan)
+
+	info("Deconvolving response")
+	channels  = list(plan["channels"])
+	reference = channels.index(plan["reference_channel"]) if plan["reference_channel"] in channels else 0
+	Y, H = excitation.deconvolve(waveform, f_rep, tones, reference)
+
+	df_response = pd.concat([
+				pd.DataFrame({
+						"frequency": tones,
+						"amplitude": np.abs(Y[index]),
+						"phase": np.angle(Y[index]),
+						"H_amplitude": np.abs(H[index]),
+						"H_phase": np.angle(H[index])
+				}).assign(**row.to_dict())
+				for index, row in df_setup.iterrows()], ignore_index=True)
+	return waveform, df_setup, df_response
+
+
+def run_broadband(AFG_2225, MSO7024, ring, con, plan, file_name, run_id, points, on_point=None, max_failures=MAX_FAILURES):
+	"""Measure and save the segments starting at the frequencies in points, return the segments missed"""
+	tiles = {tones[0].item(): (f_rep, tones) for f_rep, tones in check_resolution(plan)}
+
+	missed, consecutive = 0, 0
+	bar = tqdm(points)
+	for start in bar:
+		f_rep, tones = tiles[start]
+		bar.set_description(f"Generando {plan['excitation']} {tones[0]}-{tones[-1]} Hz" )
+		print("")
+		try:
+			waveform, df_setup, df_response = measure_segment(AFG_2225, MSO7024, ring, plan, f_rep, tones)
+		except Exception as e:
+			error("Error getting data " + str(start) + " Hz", exc_info=True)
+			missed, consecutive = missed + 1, consecutive + 1
+			if consecutive >= max_failures:
+				raise RuntimeError(f"{consecutive} consecutive segments failed, last at {start} Hz") from e
+			continue
+		consecutive = 0
+
+		info("Saving segment " + str(start) + " Hz")
+		save_waveform(file_name + "segment_" + str(start) + ".npy", waveform)
+		pyramid.build_pyramid(file_name + "segment_" + str(start), waveform)
+		df_setup.to_csv(file_name + "setup_segment_" + str(start) + ".csv")
+		df_response.to_csv(file_name + "response_segment_" + str(start) + ".csv")
+		catalog.add_response(con, run_id, df_response)
+		if on_point is not None:
+			on_point(start, waveform)
+
+		time.sleep(plan["time_waiting"])
+	if missed:
+		error(f"{missed} of {len(points)} segments could not be measured")
+	return missed
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+"""
+Configuration of pytest: the modules of the repository are imported from the
+root directory, and the scripts that need the instruments are not collected.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+collect_ignore = ["test_sweep_AFG2225.py"]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fake instruments for the tests. FakeScope answers WAV:PRE?, WAV:STAR/WAV:STOP
+and WAV:DATA? with IEEE-488.2 blocks, at most max_block points per block.
+FakeGenerator records the commands, and FakeResourceManager opens both.
+"""
+
+import numpy as np
+
+
+class FakeScope:
+	"""Oscilloscope with the data of each channel in data[channel]"""
+
+	def __init__(self, data, XRef=1e-6, YRef=128, dV=0.1, max_block=250000):
+		self.data 		= data
+		self.XRef 		= XRef
+		self.YRef 		= YRef
+		self.dV 		= dV
+		self.max_block 	= max_block
+		self.chunk_size = 4096
+		self.source 	= 1
+		self.start 		= 1
+		self.stop 		= None
+		self.buffer 	= b""
+		self.position 	= 0
+
+	def write(self, command):
+		if command.startswith("WAV:SOUR CHAN"):
+			self.source = int(command[-1])
+		elif command.startswith("WAV:STAR"):
+			self.start = int(command.split()[1])
+		elif command.startswith("WAV:STOP"):
+			self.stop = int(command.split()[1])
+		elif command == "WAV:DATA?":
+			data 	= self.data[self.source]
+			stop 	= len(data) if self.stop is None else self.stop
+			stop 	= min(stop, self.start - 1 + self.max_block)
+			block 	= bytes(np.asarray(data[self.start - 1:stop], dtype=np.uint8))
+			self.buffer   = b"#9%09d" % len(block) + block + b"\n"
+			self.position = 0
+
+	def read_bytes(self, count):
+		chunk = self.buffer[self.position:self.position + count]
+		self.position += count
+		return chunk
+
+	def query_ascii_values(self, command):
+		if command == "WAV:PRE?":
+			return [0, 0, len(self.data[self.source]), 1, self.XRef, 0, 0, self.dV, 0, self.YRef]
+		return [1.0]
+
+	def close(self):
+		pass
+
+
+class FakeGenerator:
+	"""Generator that records the commands written"""
+
+	def __init__(self):
+		self.commands = []
+
+	def write(self, command):
+		self.commands.append(command)
+
+	def close(self):
+		pass
+
+
+class FakeResourceManager:
+	"""Open a FakeGenerator for the serial port and a FakeScope for the USB resource"""
+
+	def __init__(self, scope):
+		self.scope 	   = scope
+		self.generator = FakeGenerator()
+
+	def open_resource(self, name):
+		return self.generator if name.startswith("ASRL") else self.scope
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from acquisition import BufferRing, Waveform, fetch_channels, raw_to_voltage
+from fake_instruments import FakeScope
+
+
+def test_fetch_channels_reads_long_captures_in_batches():
+	rng 	 = np.random.default_rng(0)
+	data 	 = {1: rng.integers(0, 256, 600001), 3: rng.integers(0, 256, 600001)}
+	ring 	 = BufferRing()
+	waveform, df_setup = fetch_channels(FakeScope(data), ring, [1, 3])
+
+	assert waveform.raw.shape == (2, 600001)
+	assert np.array_equal(waveform.raw[0], data[1])
+	assert np.array_equal(waveform.raw[1], data[3])
+	assert list(df_setup["channel"]) == [1, 3]
+	assert np.shares_memory(waveform.raw, ring.raw[ring.index])
+
+
+def test_fetch_channels_raises_on_short_block():
+	data = {1: np.zeros(1000), 2: np.zeros(1000)}
+	with pytest.raises(ValueError):
+		fetch_channels(FakeScope(data, max_block=100), BufferRing(), [1, 2])
+
+
+def test_volts_are_float32_and_reuse_the_ring():
+	ring 	 = BufferRing()
+	raw 	 = ring.next(2, 4)
+	raw[:] 	 = [[128, 138, 118, 128], [0, 255, 128, 128]]
+	waveform = Waveform(raw, [128, 128], [0.1, 0.5], 1e-3, ring=ring)
+
+	volts = waveform.volts()
+	assert volts.dtype == np.float32
+	assert np.allclose(volts, raw_to_voltage(raw, np.array([[128], [128]]), np.array([[0.1], [0.5]])))
+	assert np.shares_memory(volts, ring.volts[ring.index])
+	assert np.allclose(waveform.time(), [0, 1e-3, 2e-3, 3e-3])
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from acquisition import BufferRing, Waveform
+from analysis import tone_response, tone_amplitude_phase
+
+
+def test_tone_response_by_blocks_of_raw_data():
+	t 	 = np.arange(300001)*1e-6
+	ring = BufferRing()
+	raw  = ring.next(2, len(t))
+	raw[0] = np.rint(128 + 100*np.cos(2*np.pi*1000*t))
+	raw[1] = np.rint(100 + 50*np.cos(2*np.pi*1000*t - 1.0))
+	waveform = Waveform(raw, [128, 100], [0.01, 0.02], 1e-6, ring=ring)
+
+	amplitude, phase = tone_response(waveform, 1000, block=1 << 16)
+	assert np.allclose(amplitude, [1.0, 1.0], atol=1e-3)
+	assert np.allclose(phase, [0.0, -1.0], atol=1e-3)
+
+	# No se construye el arreglo float32 completo de la captura
+	assert waveform._volts is None
+	assert ring.volts[ring.index].size == 0
+	assert np.allclose(tone_amplitude_phase(waveform.volts(), 1e-6, 1000), (amplitude, phase))
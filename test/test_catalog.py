@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import catalog
+from acquisition import Waveform, save_waveform
+
+LEGACY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "med", "2023-03-31_00_09 Barrido cilindro 7.5cm EMAR 1k-1.1kHz")
+
+
+def make_legacy_run(directory):
+	"""Copy of a run of the med directory with a csv waveform at 30000 Hz"""
+	folder = os.path.join(directory, "2023-03-31_00_09 Barrido cilindro 7.5cm EMAR 1k-1.1kHz")
+	shutil.copytree(LEGACY, folder)
+	t = np.arange(10000)*1e-6
+	pd.DataFrame({
+			"Tiempo s": t,
+			"CH1 V": 2.0*np.cos(2*np.pi*30000*t),
+			"CH2 V": 0.5*np.cos(2*np.pi*30000*t - 1.0)
+	}).to_csv(os.path.join(folder, "30000.csv"))
+	return folder
+
+
+def test_backfill_analyses_legacy_csv_waveforms(tmp_path):
+	make_legacy_run(str(tmp_path))
+	con = catalog.connect(str(tmp_path/"catalog.db"))
+	catalog.backfill(con, str(tmp_path))
+
+	runs = catalog.find_runs(con, name="EMAR", min_frequency=30000, max_frequency=40000, voltaje_source=20)
+	assert len(runs) == 1
+	df = catalog.response(con, runs["id"]).set_index(["frequency", "channel"])
+	assert np.allclose(df.loc[(30000, 1), ["amplitude", "phase"]].astype(float), [2.0, 0.0], atol=1e-3)
+	assert np.allclose(df.loc[(30000, 2), ["amplitude", "phase"]].astype(float), [0.5, -1.0], atol=1e-3)
+	assert pd.isna(df.loc[(30002, 1), "amplitude"])
+
+
+def test_backfill_is_idempotent(tmp_path):
+	make_legacy_run(str(tmp_path))
+	con = catalog.connect(str(tmp_path/"catalog.db"))
+	catalog.backfill(con, str(tmp_path))
+	first = pd.read_sql_query("SELECT * FROM points ORDER BY run_id, frequency, channel", con)
+	catalog.backfill(con, str(tmp_path))
+	second = pd.read_sql_query("SELECT * FROM points ORDER BY run_id, frequency, channel", con)
+
+	assert len(first) == 4
+	pd.testing.assert_frame_equal(first, second)
+	assert con.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 1
+
+
+def test_backfill_analyses_npy_waveforms(tmp_path):
+	folder = tmp_path/"2026-10-19_10_00 EMAR npy"
+	folder.mkdir()
+	t 	= np.arange(4000)*1e-5
+	raw = np.rint(128 + 100*np.sin(2*np.pi*500*t)).astype(np.uint8)
+	save_waveform(str(folder/"500.npy"), Waveform(raw[None, :], [128], [0.01], 1e-5))
+	pd.DataFrame({"channel": [3], "XRef": [1e-5], "YRef": [128.0], "dV": [0.01]}).to_csv(folder/"setup_measurements_500.csv")
+
+	con = catalog.connect(str(tmp_path/"catalog.db"))
+	catalog.backfill(con, str(tmp_path))
+	df = catalog.response(con, catalog.find_runs(con, name="npy")["id"])
+	assert list(df["channel"]) == [3]
+	assert abs(df["amplitude"][0] - 1.0) < 1e-2
+
+
+def test_excitation_of_runs(tmp_path):
+	# Catálogo creado antes de la columna excitation
+	con = sqlite3.connect(str(tmp_path/"catalog.db"))
+	con.executescript(catalog.SCHEMA.replace(",\n\texcitation \t\tTEXT", ""))
+	con.close()
+	make_legacy_run(str(tmp_path))
+	folder = tmp_path/"2026-10-19_10_00_05 EMAR multitone"
+	folder.mkdir()
+	pd.DataFrame({"start_frequency": [30000], "excitation": ["multitone"]}).to_csv(folder/"global_configuration.csv")
+
+	con = catalog.connect(str(tmp_path/"catalog.db"))
+	catalog.backfill(con, str(tmp_path))
+	assert list(catalog.find_runs(con, name="EMAR")["excitation"]) == ["sine", "multitone"]
+	runs = catalog.find_runs(con, excitation="multitone")
+	assert list(runs["name"]) == ["EMAR multitone"]
+	assert runs["date"][0] == "2026-10-19 10:00:05"
+
+
+def test_runs_without_configuration_take_the_frequencies_of_their_points(tmp_path):
+	shutil.copytree(os.path.join(os.path.dirname(LEGACY), "2023-03-30_23_39 Test"), tmp_path/"2023-03-30_23_39 Test")
+	con = catalog.connect(str(tmp_path/"catalog.db"))
+	catalog.backfill(con, str(tmp_path))
+
+	runs = catalog.find_runs(con, min_frequency=1000, max_frequency=1100)
+	assert list(runs["name"]) == ["Test"]
+	assert (runs["start_frequency"][0], runs["stop_frequency"][0]) == (1000, 1005)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+import scipy.fft
+import pytest
+
+import excitation
+import sweep
+
+
+def response_of(signal, f_rep, gain, delay, periods=4):
+	"""Captura de varios periodos de la excitación (CH1) y su respuesta con ganancia y retardo (CH2)"""
+	k = np.arange(len(signal)//2 + 1)
+	delayed = scipy.fft.irfft(scipy.fft.rfft(signal)*np.exp(-2j*np.pi*k*f_rep*delay), len(signal))
+	volts 	= np.vstack([np.tile(signal, periods), gain*np.tile(delayed, periods)])
+	return SimpleNamespace(volts=lambda: volts, XRef=1/(len(signal)*f_rep))
+
+
+@pytest.mark.parametrize("start, stop, d_frequency", [(1000, 1100, 1), (30000, 40000, 2), (990, 5000, 3)])
+def test_segments_start_at_start_frequency(start, stop, d_frequency):
+	tiles = excitation.segments(start, stop, d_frequency)
+	tones = np.concatenate([tones for f_rep, tones in tiles])
+	assert tones[0] == start
+	assert tones[-1] < stop
+	assert np.all(np.diff(tones) > 0)
+	for f_rep, tones in tiles:
+		assert np.allclose(tones % f_rep, 0)
+		assert tones[-1] <= f_rep*excitation.PERIOD_POINTS//8
+
+
+def test_segments_snap_start_below_when_not_a_harmonic():
+	(f_rep, tones), = excitation.segments(1001, 1100, 1)
+	assert tones[0] <= 1001 < tones[0] + f_rep
+
+
+def test_coarse_resolution_is_warned(caplog):
+	plan = sweep.make_plan(start_frequency=30000, stop_frequency=40000, d_frequency=2, excitation="multitone")
+	with caplog.at_level(logging.WARNING):
+		sweep.check_resolution(plan)
+	assert "coarser than d_frequency 2 Hz" in caplog.text
+
+	caplog.clear()
+	plan = sweep.make_plan(start_frequency=1000, stop_frequency=1100, d_frequency=4, excitation="multitone")
+	with caplog.at_level(logging.WARNING):
+		sweep.check_resolution(plan)
+	assert caplog.text == ""
+
+
+def test_multitone_crest_factor():
+	f_rep, tones = excitation.segments(30000, 40000, 2)[0]
+	signal = excitation.multitone(f_rep, tones)
+	assert np.max(np.abs(signal)) == pytest.approx(1)
+	assert excitation.crest_factor(signal) < 2.5
+
+
+@pytest.mark.parametrize("kind", ["multitone", "linear", "log"])
+def test_deconvolution_recovers_gain_and_delay(kind):
+	f_rep, tones = excitation.segments(1000, 1100, 1)[0]
+	signal = excitation.multitone(f_rep, tones) if kind == "multitone" else excitation.chirp(f_rep, tones, kind=kind)
+
+	Y, H = excitation.deconvolve(response_of(signal, f_rep, 0.5, 50e-6), f_rep, tones)
+	assert np.allclose(H[0], 1)
+	assert np.allclose(np.abs(H[1]), 0.5, rtol=1e-6)
+	assert np.allclose(H[1], 0.5*np.exp(-2j*np.pi*tones*50e-6), atol=1e-6)
+
+
+@pytest.mark.parametrize("start, stop, d_frequency", [(0, 1000, 1), (2, 5000, 3)])
+def test_segments_have_no_dc_tone(start, stop, d_frequency):
+	tiles = excitation.segments(start, stop, d_frequency)
+	f_rep, tones = tiles[0]
+	assert tones[0] == f_rep
+
+	signal = excitation.chirp(f_rep, tones, kind="log")
+	Y, H = excitation.deconvolve(response_of(signal, f_rep, 0.5, 0), f_rep, tones)
+	assert np.all(np.isfinite(H))
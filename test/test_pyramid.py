@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+import pyramid
+from acquisition import Waveform, save_waveform
+
+XREF = 1e-6
+
+
+def make_point(folder, frequency, raw):
+	"""Guarda la medición y la pirámide de un punto, devuelve el nombre base"""
+	file_name = str(folder/str(frequency))
+	waveform  = Waveform(raw, [128, 100], [0.01, 0.02], XREF, channels=[1, 2])
+	save_waveform(file_name + ".npy", waveform)
+	pyramid.build_pyramid(file_name, waveform)
+	return file_name
+
+
+@pytest.fixture
+def raw():
+	return np.random.default_rng(0).integers(0, 256, size=(2, 100003), dtype=np.uint8)
+
+
+def test_levels_match_the_raw_data(tmp_path, raw):
+	file_name = make_point(tmp_path, 30000, raw)
+	for factor in pyramid.LEVELS:
+		level = np.load(f"{file_name}_pyramid_{factor}.npy", mmap_mode="r")
+		assert isinstance(level, np.memmap)
+		for i in [0, 1, len(level) - 1]:
+			block = raw[:, i*factor:(i + 1)*factor]
+			assert np.array_equal(level["min"][i], block.min(axis=1))
+			assert np.array_equal(level["max"][i], block.max(axis=1))
+			assert np.allclose(level["mean"][i], block.mean(axis=1), rtol=1e-6)
+
+
+def test_read_pyramid_picks_the_coarsest_level(tmp_path, raw):
+	file_name = make_point(tmp_path, 30000, raw)
+	t, minimum, maximum, mean = pyramid.read_pyramid(file_name, 20)
+	assert minimum.shape == (2, -(-raw.shape[1]//4096))
+
+	# Ventana de 16000 muestras: nivel 1:256, con la escala de cada canal
+	t, minimum, maximum, mean = pyramid.read_pyramid(file_name, 50, 0.032768, 0.048768)
+	a, b = 32768//256, -(-48768//256)
+	assert len(t) == b - a
+	assert np.allclose(maximum[1], (raw[1, a*256:b*256].reshape(-1, 256).max(axis=1) - 100.0)*0.02)
+	assert np.allclose(mean[0], (raw[0, a*256:b*256].reshape(-1, 256).mean(axis=1) - 128.0)*0.01, atol=1e-6)
+
+	# Sin nivel suficientemente fino se leen los datos crudos
+	t, minimum, maximum, mean = pyramid.read_pyramid(file_name, 100, 0.001, 0.0012)
+	assert np.allclose(minimum[0], (raw[0, 1000:1200] - 128.0)*0.01)
+
+
+def test_heatmap_keeps_the_peaks(tmp_path):
+	raw = np.full((2, 200*4096), 128, dtype=np.uint8) 	# 2 muestras de 1:4096 por columna
+	raw[0, 123457] = 251 	# (251 - 128)*0.01 = 1.23 V
+	raw[0, 654321] = 5
+	for frequency in [30000, 30002]:
+		make_point(tmp_path, frequency, raw)
+
+	frequencies, t, image = pyramid.heatmap(str(tmp_path), 100, statistic="max")
+	assert list(frequencies) == [30000, 30002]
+	assert len(t) == 100
+	assert image.max() == pytest.approx(1.23)
+	assert np.all(image[:, 15] == pytest.approx(1.23))
+
+	frequencies, t, image = pyramid.heatmap(str(tmp_path), 100, statistic="min")
+	assert image[0, 79] == pytest.approx(-1.23)
+
+	frequencies, t, image = pyramid.heatmap(str(tmp_path), 100, statistic="mean")
+	assert image[0, 15] == pytest.approx(1.23/8192, rel=1e-3)
+	assert image[0, 0] == pytest.approx(0)
+
+
+def test_heatmap_of_broadband_segments(tmp_path):
+	raw = np.full((2, 4096*200), 128, dtype=np.uint8)
+	raw[0, 123457] = 251
+	for start in [30000, 30660]:
+		make_point(tmp_path, f"segment_{start}", raw)
+
+	frequencies, t, image = pyramid.heatmap(str(tmp_path), 100)
+	assert list(frequencies) == [30000, 30660]
+	assert np.all(image[:, 15] == pytest.approx(1.23))
+
+
+def test_heatmap_without_pyramids(tmp_path):
+	with pytest.raises(ValueError, match="No pyramids"):
+		pyramid.heatmap(str(tmp_path), 100)
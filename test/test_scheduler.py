@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import os
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog
+import scheduler
+from fake_instruments import FakeScope, FakeResourceManager
+
+
+@pytest.fixture
+def bench(tmp_path, monkeypatch):
+	"""Work in a temporary directory with the fake instruments and without waits"""
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setattr(time, "sleep", lambda seconds: None)
+	t 	  = np.arange(2000)*1e-5
+	scope = FakeScope({1: np.rint(128 + 50*np.sin(2*np.pi*100*t)), 2: np.rint(128 + 20*np.sin(2*np.pi*100*t))}, XRef=1e-5)
+	return FakeResourceManager(scope)
+
+
+def test_plans_with_the_same_name_get_their_own_run(bench):
+	scheduler.add_plan(name_measurements="EMAR", start_frequency=100, stop_frequency=110, d_frequency=5, voltaje_source=10)
+	scheduler.add_plan(name_measurements="EMAR", start_frequency=100, stop_frequency=110, d_frequency=5, voltaje_source=20)
+	scheduler.run_queue(bench)
+
+	queue 	= scheduler.load_queue()
+	folders = [entry["folder"] for entry in queue["plans"]]
+	assert [entry["status"] for entry in queue["plans"]] == ["done", "done"]
+	assert folders[0] != folders[1]
+	assert queue["plans"][0]["run_id"] != queue["plans"][1]["run_id"]
+	for folder, voltaje_source in zip(folders, [10, 20]):
+		assert pd.read_csv(folder + "global_configuration.csv")["voltaje_source"][0] == voltaje_source
+		assert os.path.exists(folder + "100.npy") and os.path.exists(folder + "105.npy")
+
+	con = catalog.connect()
+	assert sorted(catalog.find_runs(con, name="EMAR")["voltaje_source"]) == [10, 20]
+	assert con.execute("SELECT COUNT(*) FROM points").fetchone()[0] == 8
+
+
+def test_running_plan_resumes_in_its_folder(bench):
+	scheduler.add_plan(name_measurements="EMAR", start_frequency=100, stop_frequency=120, d_frequency=5)
+	scheduler.run_queue(bench)
+	queue = scheduler.load_queue()
+	entry = queue["plans"][0]
+	os.remove(entry["folder"] + "115.npy")
+	entry.update(status="running", last_frequency=110)
+	scheduler.save_queue(queue)
+
+	scheduler.run_queue(bench)
+	queue = scheduler.load_queue()
+	assert queue["plans"][0]["folder"] == entry["folder"]
+	assert os.path.exists(entry["folder"] + "115.npy")
+	assert len(os.listdir("med")) == 3 	# carpeta, catalog.db y queue.json
+
+
+def test_remaining_points_and_projected_completion():
+	plan  = scheduler.sweep.make_plan(start_frequency=100, stop_frequency=200, d_frequency=10)
+	entry = {"plan": plan, "status": "running", "last_frequency": 140, "seconds_per_point": 2.0}
+	other = {"plan": plan, "status": "pending", "last_frequency": None, "seconds_per_point": None}
+	done  = {"plan": plan, "status": "done", "last_frequency": 190, "seconds_per_point": 5.0}
+	assert scheduler.remaining_points(entry) == [150, 160, 170, 180, 190]
+	assert list(scheduler.remaining_points(other)) == list(range(100, 200, 10))
+
+	now = datetime.datetime(2026, 10, 19, 12, 0)
+	queue = {"plans": [done, entry, other]}
+	# other usa la tasa del último plan medido con la misma configuración (entry)
+	assert scheduler.projected_completion(queue, now) == now + datetime.timedelta(seconds=5*2.0 + 10*2.0)
+	assert scheduler.projected_completion({"plans": [other]}, now) is None
+
+
+def test_plans_added_while_running_are_kept_and_run(bench, monkeypatch):
+	scheduler.add_plan(name_measurements="A", start_frequency=100, stop_frequency=110, d_frequency=5)
+	save_point = scheduler.sweep.save_point
+
+	def save_point_and_add(file_name, frequency, *args, **kwargs):
+		save_point(file_name, frequency, *args, **kwargs)
+		if "A" in file_name and frequency == 100:
+			scheduler.add_plan(name_measurements="B", start_frequency=100, stop_frequency=105, d_frequency=5)
+
+	monkeypatch.setattr(scheduler.sweep, "save_point", save_point_and_add)
+	scheduler.run_queue(bench)
+	queue = scheduler.load_queue()
+	assert [(e["plan"]["name_measurements"], e["status"]) for e in queue["plans"]] == [("A", "done"), ("B", "done")]
+	assert os.path.exists(queue["plans"][1]["folder"] + "100.npy")
+
+
+def test_queue_lock_blocks_add(tmp_path):
+	file_name = str(tmp_path/"queue.json")
+	with scheduler.queue_lock(file_name):
+		thread = threading.Thread(target=scheduler.add_plan, kwargs={"file_name": file_name, "name_measurements": "A"})
+		thread.start()
+		time.sleep(0.3)
+		assert thread.is_alive()
+		assert not os.path.exists(file_name)
+	thread.join(5)
+	assert [e["plan"]["name_measurements"] for e in scheduler.load_queue(file_name)["plans"]] == ["A"]
+	assert not os.path.exists(file_name + ".lock")
+
+
+class FailingScope(FakeScope):
+	"""Osciloscopio cuyas lecturas WAV:DATA? fallan en los puntos indicados (None: todos)"""
+
+	def __init__(self, data, fail=None, **kwargs):
+		super().__init__(data, **kwargs)
+		self.fail 	 = fail
+		self.queries = 0
+
+	def write(self, command):
+		if command == "WAV:SOUR CHAN1":
+			self.queries += 1
+		if command == "WAV:DATA?" and (self.fail is None or self.queries in self.fail):
+			raise TimeoutError("VI_ERROR_TMO")
+		super().write(command)
+
+
+def failing_bench(fail):
+	t = np.arange(2000)*1e-5
+	return FakeResourceManager(FailingScope({1: np.rint(128 + 50*np.sin(2*np.pi*100*t)), 2: np.full(2000, 128)}, fail, XRef=1e-5))
+
+
+def test_dead_instrument_fails_the_plan(bench, caplog):
+	scheduler.add_plan(name_measurements="A", start_frequency=100, stop_frequency=200, d_frequency=5)
+	scheduler.run_queue(failing_bench(None))
+
+	entry = scheduler.load_queue()["plans"][0]
+	assert entry["status"] == "failed"
+	assert [file for file in os.listdir(entry["folder"]) if file.endswith(".npy")] == []
+	assert "VI_ERROR_TMO" in caplog.text
+	assert f"{scheduler.sweep.MAX_FAILURES} consecutive points failed, last at 120 Hz" in caplog.text
+
+
+def test_missed_points_fail_the_plan(bench):
+	scheduler.add_plan(name_measurements="A", start_frequency=100, stop_frequency=120, d_frequency=5)
+	scheduler.run_queue(failing_bench({2}))
+
+	entry = scheduler.load_queue()["plans"][0]
+	assert (entry["status"], entry["missed"]) == ("failed", 1)
+	assert sorted(file for file in os.listdir(entry["folder"]) if file.endswith(".npy") and "_" not in file) == ["100.npy", "110.npy", "115.npy"]